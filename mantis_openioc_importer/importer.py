@@ -24,6 +24,8 @@ import pprint
 
 from collections import deque
 
+from django.db import transaction
+
 from django.utils import timezone
 
 from django.utils.dateparse import parse_datetime
@@ -32,21 +34,25 @@ from dingos import *
 
 from dingos.core.datastructures import DingoObjDict
 
-from dingos.core.utilities import search_by_re_list, set_dict
-
-from dingos.core.xml_utils import extract_attributes
-
 from mantis_core.import_handling import MantisImporter
 
 from mantis_core.models import FactDataType
 
-
-from mantis_core.models import Identifier
-
 pp = pprint.PrettyPrinter(indent=2)
 
 logger = logging.getLogger(__name__)
 
+# Regular expression for extracting family and revision information
+# from the namespace of an imported OpenIOC document; compiled once
+# at module load.
+
+_MANDIANT_NS_RE = re.compile(r"http://schemas\.mandiant\.com/(?P<revision>[0-9]+)/(?P<family>[^/]+)")
+
+# Attributes that have already been used during import and for which
+# no facts need to be created.
+
+_IGNORED_ATTRS = frozenset(('idref','id','value_type'))
+
 class OpenIOC_Import:
     """
     A class that implements a DINGOS importer for OpenIOC
@@ -107,10 +113,20 @@ class OpenIOC_Import:
 
 
     def __init__(self, *args, **kwargs):
+        self.reset_state()
+
         if 'namespace_dict' in kwargs:
             self.namespace_dict = kwargs['namespace_dict']
-        else:
-            self.namespace_dict = {None:DINGOS_NAMESPACE_URI}
+
+    def reset_state(self):
+        """
+        Initialize the state kept by the importer during an import.
+        """
+
+        # The namespace mapping is filled in by the generic XML import,
+        # so each import starts out with a fresh one.
+
+        self.namespace_dict = {None:DINGOS_NAMESPACE_URI}
 
         self.iobject_family_name = 'ioc.mandiant.com'
         self.iobject_family_revision_name = ''
@@ -150,8 +166,8 @@ class OpenIOC_Import:
 
 
         if initialize_importer:
-            # Clear state in case xml_import is used several times, but keep namespace info
-            self.__init__()
+            # Clear state in case xml_import is used several times
+            self.reset_state()
 
         # Initialize  default arguments
 
@@ -203,13 +219,19 @@ class OpenIOC_Import:
 
         embedded_objects = import_result['embedded_objects']
 
+        # The import result also holds the complete file content as a string,
+        # which we do not need: we drop it so that the string can be freed
+        # before the objects are written to the database.
+
+        del import_result
+
         default_ns = self.namespace_dict.get(elt_dict.get('@@ns',None),'http://schemas.mandiant.com/unknown/ioc')
 
         # Export family information.
-        family_info_dict = search_by_re_list(self.RE_LIST_NS_TYPE_FROM_NS_URL,default_ns)
-        if family_info_dict:
-            self.iobject_family_name="%s.mandiant.com" % family_info_dict['family']
-            self.iobject_family_revision_name=family_info_dict['revision']
+        family_info = _MANDIANT_NS_RE.search(default_ns)
+        if family_info:
+            self.iobject_family_name="%s.mandiant.com" % family_info.group('family')
+            self.iobject_family_revision_name=family_info.group('revision')
 
 
         # Initialize stack with import_results.
@@ -232,29 +254,55 @@ class OpenIOC_Import:
         else:
             ts = self.create_timestamp
 
+        # The configuration passed to the importer is the same for all
+        # objects, so we set it up only once.
+
+        config_hooks = {'special_ft_handler' : self.fact_handler_list(),
+                        'datatype_extractor' : self.datatype_extractor,
+                        'attr_ignore_predicate' : self.attr_ignore_predicate}
+        namespace_dict = self.namespace_dict
+        get_ns = namespace_dict.get
+        iobject_family_name = self.iobject_family_name
+        iobject_family_revision_name = self.iobject_family_revision_name
+        identifier_ns_uri = self.identifier_ns_uri
+        create_timestamp = self.create_timestamp
+
+        # We first collect the arguments for creating the Information Objects,
+        # so that no Python-side preparation happens within the transaction below.
+
+        pending_iobjects = []
+
         while pending_stack:
             (id_and_rev_info, elt_name, elt_dict) = pending_stack.pop()
 
-            # Call the importer that turns DingoObjDicts into Information Objects in the database
             iobject_type_name = elt_name
-            iobject_type_namespace_uri = self.namespace_dict.get(elt_dict.get('@@ns',None),DINGOS_GENERIC_FAMILY_NAME)
-
-            MantisImporter.create_iobject(iobject_family_name = self.iobject_family_name,
-                                          iobject_family_revision_name= self.iobject_family_revision_name,
-                                          iobject_type_name=iobject_type_name,
-                                          iobject_type_namespace_uri=iobject_type_namespace_uri,
-                                          iobject_type_revision_name= '',
-                                          iobject_data=elt_dict,
-                                          uid=id_and_rev_info['id'],
-                                          identifier_ns_uri= self.identifier_ns_uri,
-                                          timestamp = ts,
-                                          create_timestamp = self.create_timestamp,
-                                          markings=markings,
-                                          config_hooks = {'special_ft_handler' : self.fact_handler_list(),
-                                                          'datatype_extractor' : self.datatype_extractor,
-                                                          'attr_ignore_predicate' : self.attr_ignore_predicate},
-                                          namespace_dict=self.namespace_dict,
-                                          )
+            iobject_type_namespace_uri = get_ns(elt_dict.get('@@ns',None),DINGOS_GENERIC_FAMILY_NAME)
+
+            pending_iobjects.append({'iobject_family_name' : iobject_family_name,
+                                     'iobject_family_revision_name' : iobject_family_revision_name,
+                                     'iobject_type_name' : iobject_type_name,
+                                     'iobject_type_namespace_uri' : iobject_type_namespace_uri,
+                                     'iobject_type_revision_name' : '',
+                                     'iobject_data' : elt_dict,
+                                     'uid' : id_and_rev_info['id'],
+                                     'identifier_ns_uri' : identifier_ns_uri,
+                                     'timestamp' : ts,
+                                     'create_timestamp' : create_timestamp,
+                                     'markings' : markings,
+                                     'config_hooks' : config_hooks,
+                                     'namespace_dict' : namespace_dict})
+
+        # Call the importer that turns DingoObjDicts into Information Objects in the database;
+        # all objects of the import are written within a single transaction.
+        #
+        # The objects are created one after the other: embedded objects are created
+        # before the objects referring to them, the types, fact terms and values
+        # shared between objects are created on first use, and Django database
+        # connections (and thus the transaction) are bound to the current thread.
+
+        with transaction.atomic():
+            for iobject_kargs in pending_iobjects:
+                MantisImporter.create_iobject(**iobject_kargs)
 
 
 
@@ -264,9 +312,6 @@ class OpenIOC_Import:
     #
 
 
-    RE_LIST_NS_TYPE_FROM_NS_URL = [re.compile("http://schemas.mandiant.com/(?P<revision>[0-9]+)/(?P<family>[^/]+)")]
-
-
     def id_and_revision_extractor(self,xml_elt):
         """
         Function for determing an identifier (and, where applicable, timestamp/revision
@@ -302,16 +347,20 @@ class OpenIOC_Import:
         result = {'id':None,
                   'timestamp': None}
 
-        attributes = extract_attributes(xml_elt,prefix_key_char='@')
+        # We only need two attributes, so we read them directly
+        # rather than extracting all attributes of the element.
+
+        uid = xml_elt.noNsProp('id')
+        last_modified = xml_elt.noNsProp('last-modified')
 
         # Extract identifier:
-        if '@id' in attributes:
-            result['id']=attributes['@id']
+        if uid is not None:
+            result['id']=uid
 
         # Extract time-stamp
 
-        if '@last-modified' in attributes:
-            naive = parse_datetime(attributes['@last-modified'].strip())
+        if last_modified is not None:
+            naive = parse_datetime(last_modified.strip())
             if naive:
                 # Make sure that information regarding the timezone is
                 # included in the time stamp. If it is not, we chose
@@ -321,8 +370,9 @@ class OpenIOC_Import:
                 # this serves the main purpose of time stamps for our
                 # means: we can find out the latest revision of a
                 # given piece of data.
-                if not timezone.is_aware(naive):
-                    aware = timezone.make_aware(naive,timezone.utc)
+                if naive.tzinfo is None:
+                    # For utc, this is what timezone.make_aware amounts to.
+                    aware = naive.replace(tzinfo=timezone.utc)
                 else:
                     aware = naive
                 result['timestamp']= aware
@@ -362,11 +412,15 @@ class OpenIOC_Import:
 
         # For openIOC, we extract the Indicator-Item elements,
         # since those correspond to observables.
+        #
+        # The predicate is called for every node visited by the generic
+        # importer, so we look at the element name first: only for
+        # IndicatorItems do we need to look at the attributes at all.
 
-        child_attributes = extract_attributes(child,prefix_key_char='')
-
+        if child.name != 'IndicatorItem':
+            return False
 
-        if ('id' in child_attributes and child.name == 'IndicatorItem'):
+        if child.noNsProp('id') is not None:
 
             # The embedding predicate is supposed to not only return
             # 'True' or 'False', but in case there is an embedding,
@@ -390,11 +444,12 @@ class OpenIOC_Import:
             grandchild = child.children
             type_info = None
 
+            # We only need the single 'document' attribute of the Context element,
+            # so we read it directly rather than extracting all attributes.
+
             while grandchild is not None:
                 if grandchild.name == 'Context':
-                    context_attributes = extract_attributes(grandchild,prefix_key_char='')
-                    if 'document' in context_attributes:
-                        type_info = context_attributes['document']
+                    type_info = grandchild.noNsProp('document')
                     break
                 grandchild = grandchild.next
 
@@ -446,10 +501,16 @@ class OpenIOC_Import:
         else:
             # We have an indicator item.
 
-            # We initialize the resulting DingoObjDict
-            result = DingoObjDict()
+            context = contents['Context']
+            content = contents['Content']
+
+            # We extract the search term and split it into its elements (removing
+            # the redundant first element '<something>Item'.)
+
+            (document_type,search_term) = context['@search'].split('/',1)
+            search_term = search_term.split('/')
 
-            # We initialize the dictionary that will contain the leaf (in the example given
+            # We create the dictionary that contains the leaf (in the example given
             # above, that would be the dictionary representing the following bit of
             # XML::
             #
@@ -457,34 +518,25 @@ class OpenIOC_Import:
             #      .stub
             #     </Name>
             #
+            # DingoObjDict is ordered, so we pass the items as a list of pairs.
 
-            leaf = DingoObjDict()
-
-            # We extract the search term and split it into its elements (removing
-            # the redundant first element '<something>Item'.)
-
-            (document_type,search_term) = contents['Context']['@search'].split("/",1)
-            search_term = search_term.split('/')
-
-            # We extract the data for the leaf dictionary
-            search_value = contents['Content']['_value']
-            value_type = contents['Content']['@type']
-            search_condition = contents['@condition']
-
-            leaf['@value_type'] = value_type
-            leaf['@condition'] = search_condition
-            leaf['_value'] = search_value
-
-
-            # We extract the identifier
+            leaf = DingoObjDict([('@value_type', content['@type']),
+                                 ('@condition', contents['@condition']),
+                                 ('_value', content['_value'])])
 
-            item_id = contents['@id']
+            # We write the nested dictionary structure from the leaf upwards; since
+            # every level is freshly created, there is no need for set_dict's
+            # lookups of existing keys.
 
-            result['@id'] = item_id
+            node = leaf
+            for key in reversed(search_term[1:]):
+                node = DingoObjDict([(key, node)])
 
-            # We write the nested dictionary structure:
+            # The resulting DingoObjDict carries the identifier and the first
+            # level of the nested structure.
 
-            set_dict(result,leaf,'set',*search_term)
+            result = DingoObjDict([('@id', contents['@id']),
+                                   (search_term[0], node)])
 
         return (document_type,result)
 
@@ -598,11 +650,13 @@ class OpenIOC_Import:
             identifier_ns_uri=namespace_uri,
             timestamp=timestamp)
 
-        logger.debug("Creation of Placeholder for %s %s returned %s" % (namespace_uri,uid,existed))
+        logger.debug("Creation of Placeholder for %s %s returned %s",namespace_uri,uid,existed)
 
-        # What remains to be done is to write the reference to the created placeholder object
+        # What remains to be done is to write the reference to the created placeholder object.
+        # The object returned by create_iobject already carries its identifier, so there is
+        # no need to query for it.
 
-        add_fact_kargs['value_iobject_id'] = Identifier.objects.get(uid=uid,namespace__uri=namespace_uri)
+        add_fact_kargs['value_iobject_id'] = target_mantis_obj.identifier
 
         # Handlers have to return 'True', otherwise the fact will not be created.
 
@@ -676,7 +730,7 @@ class OpenIOC_Import:
 
         """
 
-        return [(lambda fact,  attr_info: "idref" in attr_info.keys(),
+        return [(lambda fact,  attr_info: "idref" in attr_info,
                  self.reference_handler)]
 
     def attr_ignore_predicate(self,fact_dict):
@@ -697,10 +751,11 @@ class OpenIOC_Import:
 
         """
 
-        if '@' in fact_dict['attribute']:
+        attr = fact_dict['attribute']
+        if attr.startswith('@'):
             # We remove all attributes added by Dingo during import
             return True
-        if fact_dict['attribute'] in ['idref','id','value_type']:
+        if attr in _IGNORED_ATTRS:
             # The attributes idref, id and value_type we have already used during import;
             # there is no need to keep those around.
             return True
@@ -772,9 +827,10 @@ class OpenIOC_Import:
 
             return True
 
-        elif "value_type" in attr_info:
+        value_type = attr_info.get("value_type",None)
+        if value_type is not None:
             # If a value_type attribute is given, we extract the data type from this value.
-            add_fact_kargs['fact_dt_name'] = attr_info["value_type"]
+            add_fact_kargs['fact_dt_name'] = value_type
             add_fact_kargs['fact_dt_namespace_uri'] = namespace_mapping[None]
             return True
         return False
@@ -36,7 +36,7 @@ setup(
     ],
     include_package_data=True,
     install_requires=[
-        "django>=1.5.5",
+        "django>=1.6",
         "django-dingos>=0.1.0",
         "django-mantis-core>=0.1.0",
     ],
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_transformer
+------------
+
+Tests for the transformer hook of the OpenIOC importer, which rewrites
+IndicatorItems into nested DingoObjDicts.
+"""
+
+
+from django import test
+
+from dingos.core.datastructures import DingoObjDict, dict2tuple
+
+from mantis_openioc_importer.importer import OpenIOC_Import
+
+
+def indicator_item(search):
+    """
+    Returns the dictionary representation of an IndicatorItem
+    with the given search path, as handed to the transformer.
+    """
+    return {'@id': 'b9ef2559-cc59-4463-81d9-52800545e16e',
+            '@condition': 'contains',
+            'Context': {'@document': search.split('/')[0],
+                        '@search': search,
+                        '@type': 'mir'},
+            'Content': {'@type': 'string',
+                        '_value': '.stub'}}
+
+
+LEAF = (('@value_type', 'string'),
+        ('@condition', 'contains'),
+        ('_value', '.stub'))
+
+
+class Transformer_Tests(test.SimpleTestCase):
+
+    def setUp(self):
+        self.importer = OpenIOC_Import()
+
+    def assertNestedDingoObjDicts(self, value):
+        self.assertIsInstance(value, DingoObjDict)
+        for key in value.keys():
+            if key not in ('@id', '@value_type', '@condition', '_value'):
+                self.assertNestedDingoObjDicts(value[key])
+
+    def test_other_elements_unchanged(self):
+        contents = DingoObjDict()
+        self.assertEqual(self.importer.transformer('Indicator', contents),
+                         ('Indicator', contents))
+
+    def test_multi_level_search(self):
+        (elt_name, result) = self.importer.transformer('IndicatorItem',
+                                                       indicator_item('FileItem/PEInfo/Sections/Section/Name'))
+
+        self.assertEqual(elt_name, 'FileItem')
+        self.assertNestedDingoObjDicts(result)
+        self.assertEqual(dict2tuple(result),
+                         (('@id', 'b9ef2559-cc59-4463-81d9-52800545e16e'),
+                          ('PEInfo', (('Sections', (('Section', (('Name', LEAF),)),)),))))
+
+    def test_single_level_search(self):
+        (elt_name, result) = self.importer.transformer('IndicatorItem',
+                                                       indicator_item('FileItem/FileName'))
+
+        self.assertEqual(elt_name, 'FileItem')
+        self.assertNestedDingoObjDicts(result)
+        self.assertEqual(dict2tuple(result),
+                         (('@id', 'b9ef2559-cc59-4463-81d9-52800545e16e'),
+                          ('FileName', LEAF)))
+
+    def test_repeated_segment_search(self):
+        (elt_name, result) = self.importer.transformer('IndicatorItem',
+                                                       indicator_item('A/B/B'))
+
+        self.assertEqual(elt_name, 'A')
+        self.assertNestedDingoObjDicts(result)
+        self.assertEqual(dict2tuple(result),
+                         (('@id', 'b9ef2559-cc59-4463-81d9-52800545e16e'),
+                          ('B', (('B', LEAF),))))
+
+    def test_search_without_separator(self):
+        self.assertRaises(ValueError,
+                          self.importer.transformer, 'IndicatorItem', indicator_item('FileItem'))